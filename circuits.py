@@ -12,23 +12,83 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import re
 from collections import namedtuple
+from functools import cached_property, lru_cache
 
+import numpy as np
 import networkx as nx
 
-Transistor = namedtuple('Transistor', 'name,drain,gate,source')
+Transistor = namedtuple('Transistor', 'name,drain,gate,source,type')
+
+# Integer identifiers of transistor types; nodes that are not
+# transistors (nets) have type 0
+_TYPE_IDS = {'nmos': 1, 'pmos': 2}
+
+# Matches the name, drain, gate, source, and type fields of netlist
+# lines that declare an nmos or pmos transistor.  The type must be a
+# separate word following the source, so net names containing "nmos"
+# or "pmos" are not mistaken for it.
+_TRANSISTOR_RE = re.compile(
+    r'^[ \t]*(\S+)[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)[ \t]+.*?\b(nmos|pmos)\b',
+    re.M | re.I)
 
 
 class Circuit:
     def __init__(self, netlist_file):
         """Create circuit definition from netlist file
-        
+
+        The netlist attribute is a copy of the parsed file; A,
+        node_index, types, and G are all derived from the file contents,
+        so changing netlist does not affect them.
+
         Args:
             netlist_file (str)
+
+        Attributes:
+            netlist (list): Transistor instances in the netlist file
+            A (numpy.ndarray): adjacency matrix of the circuit graph
+            node_index (dict): index of each node in the rows of A
+            types (dict): integer type of each node (0 for nets)
+            G (networkx.Graph): graph of the circuit, constructed on
+                first use
         """
-        with open(netlist_file, 'r') as f:
-            self.netlist = _parse_netlist(f)
-        self.G = _create_graph(self.netlist)
+        path = os.path.abspath(netlist_file)
+        self._transistors, node_index, A = _load_netlist(path, os.path.getmtime(path))
+        self.netlist = list(self._transistors)
+        self.node_index = dict(node_index)
+        self.A = A.copy()
+
+        self.types = dict.fromkeys(self.node_index, 0)
+        self.types.update((t.name, _TYPE_IDS[t.type]) for t in self._transistors)
+
+    @cached_property
+    def G(self):
+        """networkx.Graph: graph of the circuit, constructed on first use"""
+        return _create_graph(self._transistors)
+
+
+@lru_cache(maxsize=64)
+def _load_netlist(path, mtime):
+    """Parse netlist file and construct its adjacency matrix
+
+    Results are cached.  The modification time is part of the cache
+    key so that a file is parsed again after it changes.
+
+    Args:
+        path (str): absolute path of the netlist file
+        mtime (float): modification time of the file
+
+    Returns:
+        tuple: tuple of Transistor instances, dict mapping node names to
+        indices, and read-only adjacency matrix
+    """
+    with open(path, 'r') as f:
+        netlist = _parse_netlist(f)
+    node_index, A = _create_adjacency(netlist)
+    A.flags.writeable = False
+    return tuple(netlist), node_index, A
 
 
 def _parse_netlist(file_obj):
@@ -37,13 +97,37 @@ def _parse_netlist(file_obj):
     Returns:
         list: list of Transistor instances
     """
-    netlist = []
-    for line in file_obj:
-        if not ('nmos' in line or 'pmos' in line):
-            continue
-        values = line.split()
-        netlist.append(Transistor(*values[:4]))
-    return netlist
+    data = file_obj.read()
+    return [Transistor(*m.group(1, 2, 3, 4), m.group(5).lower())
+            for m in _TRANSISTOR_RE.finditer(data)]
+
+
+def _create_adjacency(netlist):
+    """Construct adjacency matrix from netlist
+
+    Nodes are ordered as in the graph returned by _create_graph.
+
+    Args:
+        netlist (list):
+            List of Transistor instances obtained from _parse_netlist
+
+    Returns:
+        tuple: dict mapping node names to indices, and numpy.ndarray
+        adjacency matrix of dtype uint8
+    """
+    node_index = {}
+    for t in netlist:
+        for node in (t.name, t.drain, t.gate, t.source):
+            node_index.setdefault(node, len(node_index))
+
+    rows = [node_index[t.name] for t in netlist for _ in range(3)]
+    cols = [node_index[x] for t in netlist for x in (t.drain, t.gate, t.source)]
+
+    n = len(node_index)
+    A = np.zeros((n, n), dtype=np.uint8)
+    A[rows, cols] = 1
+    A[cols, rows] = 1
+    return node_index, A
 
 
 def _create_graph(netlist):
@@ -54,11 +138,12 @@ def _create_graph(netlist):
             List of Transistor instances obtained from _parse_netlist
     
     Returns:
-        networkx.Graph
+        networkx.Graph: transistor nodes have a 'type' attribute set to
+        'nmos' or 'pmos'
     """
     G = nx.Graph()
-    for t in netlist:
-        G.add_edges_from([(t.name, t.drain), (t.name, t.gate), (t.name, t.source)])
+    G.add_edges_from((t.name, x) for t in netlist for x in (t.drain, t.gate, t.source))
+    nx.set_node_attributes(G, {t.name: t.type for t in netlist}, 'type')
     return G
 
 
@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import itertools
+from functools import lru_cache
+
 import numpy as np
 import networkx as nx
 
@@ -28,6 +30,12 @@ import dimod
 from dwave.system import LeapHybridDQMSampler
 
 
+@lru_cache(maxsize=None)
+def _get_sampler():
+    """Return hybrid DQM sampler, shared across calls"""
+    return LeapHybridDQMSampler()
+
+
 def create_dqm(G1, G2):
     """Construct DQM based on two graphs
     
@@ -41,12 +49,35 @@ def create_dqm(G1, G2):
     Returns:
         DiscreteQuadraticModel
     """
-    n = G1.number_of_nodes()
-    if n != G2.number_of_nodes():
+    if G1.number_of_nodes() != G2.number_of_nodes():
         raise ValueError
 
     G1_nodes = list(G1.nodes)
-    G2_nodes = list(G2.nodes)
+    A1 = nx.to_numpy_array(G1, nodelist=G1_nodes, dtype=np.uint8, weight=None)
+    A2 = nx.to_numpy_array(G2, dtype=np.uint8, weight=None)
+
+    return _create_dqm(G1_nodes, A1, A2)
+
+
+def _create_dqm(G1_nodes, A1, A2, types1=None, types2=None):
+    """Construct DQM based on adjacency matrices of two graphs
+
+    Args:
+        G1_nodes (list):
+            Nodes of graph 1, in the order of the rows of A1
+        A1 (numpy.ndarray)
+        A2 (numpy.ndarray)
+        types1 (list, optional):
+            Node types of graph 1, in the order of the rows of A1.  If
+            given with types2, mapping a node onto a node of a
+            different type is penalized.
+        types2 (list, optional):
+            Node types of graph 2, in the order of the rows of A2
+
+    Returns:
+        DiscreteQuadraticModel
+    """
+    n = len(G1_nodes)
 
     dqm = dimod.DiscreteQuadraticModel()
 
@@ -56,7 +87,7 @@ def create_dqm(G1, G2):
     # use a penalty model for each direction of the bijection constraint.
     dqm.offset = n
 
-    for node in G1.nodes:
+    for node in G1_nodes:
         # Discrete variable for node i in graph G1, with cases
         # representing the nodes in graph G2
         dqm.add_variable(n, node)
@@ -64,13 +95,17 @@ def create_dqm(G1, G2):
     # Set up the coefficients associated with the constraints that
     # each node in G2 is chosen once.  This represents the H_A
     # component of the energy function.
+    linear = np.full((n, n), -1.0)
+
+    # Mapping a node onto a node of a different type is penalized with
+    # coefficient C, so that zero-energy states are equivalences rather
+    # than just isomorphisms.  Any positive value has this property.
+    if types1 is not None and types2 is not None:
+        C = 2.0
+        linear += C * np.not_equal.outer(types1, types2)
 
-    for node in G1.nodes:
-        dqm.set_linear(node, np.repeat(-1.0, n))
-    for itarget in range(n):
-        for ivar,node1 in enumerate(G1_nodes):
-            for node2 in G1_nodes[ivar+1:]:
-                dqm.set_quadratic_case(node1, itarget, node2, itarget, 2.0)
+    for node, biases in zip(G1_nodes, linear):
+        dqm.set_linear(node, biases)
 
     # Set up the coefficients associated with the constraints that
     # selected edges must appear in both graphs, which is the H_B
@@ -80,37 +115,50 @@ def create_dqm(G1, G2):
     # simple test problems.
     B = 2.0
 
-    # For all edges in G1, penalizes mappings to edges not in G2
-    for e1 in G1.edges:
-        for e2_indices in itertools.combinations(range(n), 2):
-            e2 = (G2_nodes[e2_indices[0]], G2_nodes[e2_indices[1]])
-            if e2 in G2.edges:
-                continue
-            # In the DQM, the discrete variables represent nodes in
-            # the first graph and are named according to the node
-            # names.  The cases for each discrete variable represent
-            # nodes in the second graph and are indices from 0..n-1
-            dqm.set_quadratic_case(e1[0], e2_indices[0], e1[1], e2_indices[1], B)
-            dqm.set_quadratic_case(e1[0], e2_indices[1], e1[1], e2_indices[0], B)
-
-    # For all edges in G2, penalizes mappings to edges not in G1
-    for e2 in G2.edges:
-        e2_indices = (G2_nodes.index(e2[0]), G2_nodes.index(e2[1]))
-        for e1 in itertools.combinations(G1.nodes, 2):
-            if e1 in G1.edges:
-                continue
-            dqm.set_quadratic_case(e1[0], e2_indices[0], e1[1], e2_indices[1], B)
-            dqm.set_quadratic_case(e1[0], e2_indices[1], e1[1], e2_indices[0], B)
+    # Mapping nodes i,j of G1 onto nodes a,b of G2 is penalized when
+    # exactly one of (i,j) and (a,b) is an edge.  The interaction
+    # block for a pair of variables therefore depends only on whether
+    # the pair is an edge in G1, so both possible blocks are computed
+    # once up front.  In the DQM, the discrete variables represent
+    # nodes in the first graph and are named according to the node
+    # names.  The cases for each discrete variable represent nodes in
+    # the second graph and are indices from 0..n-1.  The H_A penalty
+    # for choosing the same target twice is placed on the diagonal of
+    # each block, so each pair of variables is set with a single call.
+    blocks = B * np.stack([A2, 1 - A2]).astype(float)
+    for biases in blocks:
+        np.fill_diagonal(biases, 2.0)
+
+    for i, node1 in enumerate(G1_nodes):
+        for j in range(i+1, n):
+            dqm.set_quadratic(node1, G1_nodes[j], blocks[A1[i, j]])
 
     return dqm
 
 
-def find_isomorphism(G1, G2):
+def _create_circuit_dqm(C1, C2):
+    """Construct DQM for equivalence of two circuits
+
+    Args:
+        C1 (Circuit)
+        C2 (Circuit)
+
+    Returns:
+        DiscreteQuadraticModel
+    """
+    return _create_dqm(list(C1.node_index), C1.A, C2.A,
+                       list(C1.types.values()), list(C2.types.values()))
+
+
+def find_isomorphism(G1, G2, classical=False):
     """Search for isomorphism between two graphs
 
     Args:
         G1 (networkx.Graph)
         G2 (networkx.Graph)
+        classical (bool):
+            If True, solve locally with the VF2++ algorithm instead of
+            the hybrid DQM solver.
 
     Returns:
         If no isomorphism is found, returns None.  Otherwise, returns
@@ -119,8 +167,14 @@ def find_isomorphism(G1, G2):
     """
     if G1.number_of_nodes() != G2.number_of_nodes():
         return None
+    if G1.number_of_edges() != G2.number_of_edges():
+        return None
+    if sorted(d for _,d in G1.degree()) != sorted(d for _,d in G2.degree()):
+        return None
+    if classical:
+        return nx.vf2pp_isomorphism(G1, G2)
     dqm = create_dqm(G1, G2)
-    sampler = LeapHybridDQMSampler()
+    sampler = _get_sampler()
     results = sampler.sample_dqm(dqm, label='Example - Circuit Equivalence')
 
     best = results.first
@@ -132,7 +186,7 @@ def find_isomorphism(G1, G2):
         return None
 
 
-def find_equivalence(C1, C2):
+def find_equivalence(C1, C2, classical=False):
     """Search for equivalence between two circuits
 
     This requires that the corresponding graphs are isomorphic and
@@ -142,39 +196,41 @@ def find_equivalence(C1, C2):
     Args:
         C1 (Circuit)
         C2 (Circuit)
+        classical (bool):
+            If True, solve locally with the VF2++ algorithm instead of
+            the hybrid DQM solver.
     
     Returns:
         If no equivalence is found, returns None.  Otherwise, returns
         dict with keys as nodes from graph 1 and values as
         corresponding nodes from graph 2.
     """
-    if C1.G.number_of_nodes() != C2.G.number_of_nodes():
+    if len(C1.node_index) != len(C2.node_index):
         return None
-    dqm = create_dqm(C1.G, C2.G)
-    sampler = LeapHybridDQMSampler()
+    if _degree_signature(C1) != _degree_signature(C2):
+        return None
+    if classical:
+        return nx.vf2pp_isomorphism(C1.G, C2.G, node_label='type')
+    dqm = _create_circuit_dqm(C1, C2)
+    sampler = _get_sampler()
     results = sampler.sample_dqm(dqm, label='Example - Circuit Equivalence')
 
-    if not np.isclose(results.first.energy, 0.0):
+    best = results.first
+    if np.isclose(best.energy, 0.0):
+        G2_nodes = list(C2.node_index)
+        return {k: G2_nodes[i] for k,i in best.sample.items()}
+    else:
+        # Equivalence not found
         return None
 
-    G2_nodes = list(C2.G.nodes)
 
-    for sample, energy in results.data(fields=['sample','energy']):
-        if np.isclose(energy, 0.0):
-            # Now check that the transistor types match
-            mapping = {k: G2_nodes[i] for k,i in sample.items()}
-            valid = True
-            for n1,n2 in mapping.items():
-                if ('nMOS' in n1 and 'nMOS' not in n2) or ('pMOS' in n1 and 'pMOS' not in n2):
-                    valid = False
-                    break
-            if valid:
-                return mapping
-        else:
-            # Sample is not an isomorphism
-            return None
+def _degree_signature(C):
+    """Sorted (type, degree) pairs of the nodes of a circuit
 
-    return None
+    Equivalent circuits must have the same signature, so comparing
+    signatures rules out most non-equivalent pairs without solving.
+    """
+    return sorted(zip(C.types.values(), C.A.sum(axis=1).tolist()))
 
 
 def plot_graphs(G1, G2, node_mapping):
@@ -197,8 +253,8 @@ def plot_graphs(G1, G2, node_mapping):
 
     colors = itertools.cycle(mcolors.TABLEAU_COLORS)
     G1_colors = [c for c,i in zip(colors, G1.nodes)]
-    G2_targets = [node_mapping[n] for n in G1.nodes]
-    G2_colors = [G1_colors[G2_targets.index(n)] for n in G2.nodes]
+    G2_index = {node_mapping[n]: i for i,n in enumerate(G1.nodes)}
+    G2_colors = [G1_colors[G2_index[n]] for n in G2.nodes]
 
     nx.draw(G1, with_labels=True, ax=axes[0], node_color=G1_colors)
     nx.draw(G2, with_labels=True, ax=axes[1], node_color=G2_colors)
@@ -216,13 +272,14 @@ if __name__ == '__main__':
     parser.add_argument("netlist2", nargs='?', default="netlists/cmos_nand_2.txt", help="netlist file specifying second circuit (default: %(default)s)")
     parser.add_argument("--show-plot",  action='store_true', help="display plot of graphs of the circuits")
     parser.add_argument("--save-plot",  action='store_true', help="save plot of graphs of the circuits to file")
+    parser.add_argument("--classical",  action='store_true', help="solve locally with the classical VF2++ algorithm instead of the hybrid solver")
 
     args = parser.parse_args()
 
     C1 = Circuit(args.netlist1)
     C2 = Circuit(args.netlist2)
 
-    results = find_equivalence(C1, C2)
+    results = find_equivalence(C1, C2, classical=args.classical)
 
     if results is None:
         print('No equivalence found')
@@ -12,18 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import unittest
 import subprocess
 import os
 import sys
 
+import networkx as nx
 from dwave.cloud.utils import retried
 
 from tests import hybrid_solver_available
-from circuits import Circuit
-from equivalence import find_isomorphism, find_equivalence
+from circuits import Circuit, Transistor, _parse_netlist
+from equivalence import (create_dqm, find_isomorphism, find_equivalence,
+                         _create_dqm, _create_circuit_dqm)
 
 example_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+example_file = os.path.join(example_dir, "equivalence.py")
 
 
 class TestCircuits(unittest.TestCase):
@@ -33,6 +37,56 @@ class TestCircuits(unittest.TestCase):
         self.assertEqual(len(C.netlist), 4)
         self.assertEqual(C.G.number_of_nodes(), 10)
 
+    def test_parse_whitespace(self):
+        f = io.StringIO("%MOS Drain Gate Source Type\n"
+                        "  pMOS_0 Vout V2 Vs pmos\n"
+                        "nMOS_0\tgnd\tnode0\tV2\tnmos\n")
+
+        self.assertEqual(_parse_netlist(f), [
+            Transistor('pMOS_0', 'Vout', 'V2', 'Vs', 'pmos'),
+            Transistor('nMOS_0', 'gnd', 'node0', 'V2', 'nmos'),
+        ])
+
+    def test_parse_type_in_net_name(self):
+        f = io.StringIO("M1 vnmos g s_pmos NMOS\n"
+                        "M2 d g s_nmos\n")
+
+        self.assertEqual(_parse_netlist(f), [
+            Transistor('M1', 'vnmos', 'g', 's_pmos', 'nmos'),
+        ])
+
+    def test_adjacency(self):
+        C = Circuit("netlists/cmos_nand_1.txt")
+
+        self.assertEqual(list(C.node_index), list(C.G.nodes))
+        self.assertEqual(C.A.shape, (10, 10))
+        self.assertEqual(C.A.sum(), 2 * C.G.number_of_edges())
+        self.assertTrue((C.A == C.A.T).all())
+
+    def test_cached_parsing(self):
+        C1 = Circuit("netlists/cmos_nand_1.txt")
+        C2 = Circuit("netlists/cmos_nand_1.txt")
+
+        self.assertIs(C1._transistors, C2._transistors)
+        self.assertIsNot(C1.netlist, C2.netlist)
+
+        C1.A[0, 0] = 1
+        self.assertEqual(C2.A[0, 0], 0)
+
+    def test_graph_matches_adjacency(self):
+        C = Circuit("netlists/cmos_nand_1.txt")
+        C.netlist.pop()
+
+        self.assertEqual(list(C.G.nodes), list(C.node_index))
+        self.assertEqual(C.A.sum(), 2 * C.G.number_of_edges())
+
+    def test_types(self):
+        C = Circuit("netlists/cmos_nand_1.txt")
+
+        self.assertEqual(C.types['nMOS_0'], C.types['nMOS_1'])
+        self.assertNotEqual(C.types['nMOS_0'], C.types['pMOS_0'])
+        self.assertNotEqual(C.types['nMOS_0'], C.types['Vout'])
+
 
 @unittest.skipUnless(hybrid_solver_available(), "requires hybrid solver")
 class TestIsomorphism(unittest.TestCase):
@@ -77,13 +131,89 @@ class TestEquivalence(unittest.TestCase):
         self.assertEqual(results, None)
 
 
+class TestDQM(unittest.TestCase):
+    def _energy(self, C1, C2, mapping, types=True):
+        """Energy of the circuit DQM at a node mapping from C1 to C2"""
+        if types:
+            dqm = _create_circuit_dqm(C1, C2)
+        else:
+            dqm = _create_dqm(list(C1.node_index), C1.A, C2.A)
+        return dqm.energy({n1: C2.node_index[n2] for n1,n2 in mapping.items()})
+
+    def test_weighted_edges(self):
+        # Edge weights must not affect the model
+        G1 = nx.Graph()
+        G1.add_edge(0, 1, weight=2)
+        G1.add_edge(1, 2, weight=0.5)
+        G2 = nx.path_graph(3)
+
+        dqm = create_dqm(G1, G2)
+        self.assertEqual(dqm.energy({0: 0, 1: 1, 2: 2}), 0.0)
+        self.assertGreater(dqm.energy({0: 0, 1: 2, 2: 1}), 0.0)
+
+    def test_equivalent_energy(self):
+        C1 = Circuit("netlists/cmos_nand_1.txt")
+        C2 = Circuit("netlists/cmos_nand_2.txt")
+
+        mapping = find_equivalence(C1, C2, classical=True)
+        self.assertEqual(self._energy(C1, C2, mapping), 0.0)
+
+    def test_swapped_types_energy(self):
+        C1 = Circuit("netlists/cmos_nand_1.txt")
+        C2 = Circuit("netlists/cmos_nor_1.txt")
+
+        # Any isomorphism between these circuits swaps nMOS and pMOS
+        mapping = find_isomorphism(C1.G, C2.G, classical=True)
+        self.assertEqual(self._energy(C1, C2, mapping, types=False), 0.0)
+        self.assertGreater(self._energy(C1, C2, mapping), 0.0)
+
+
+class TestInvariants(unittest.TestCase):
+    def test_unequal_degrees(self):
+        # Rejected before the DQM is constructed, so no solver is needed
+        C1 = Circuit("netlists/cmos_nand_1.txt")
+        C2 = Circuit("netlists/cmos_nand_error.txt")
+
+        self.assertEqual(find_isomorphism(C1.G, C2.G), None)
+        self.assertEqual(find_equivalence(C1, C2), None)
+
+
+class TestClassical(unittest.TestCase):
+    def test_isomorphs(self):
+        C1 = Circuit("netlists/cmos_nand_1.txt")
+        C2 = Circuit("netlists/cmos_nand_2.txt")
+
+        results = find_isomorphism(C1.G, C2.G, classical=True)
+        self.assertNotEqual(results, None)
+
+    def test_non_isomorph(self):
+        C1 = Circuit("netlists/cmos_nand_1.txt")
+        C2 = Circuit("netlists/cmos_nand_error.txt")
+
+        results = find_isomorphism(C1.G, C2.G, classical=True)
+        self.assertEqual(results, None)
+
+    def test_equivalent(self):
+        C1 = Circuit("netlists/cmos_nand_1.txt")
+        C2 = Circuit("netlists/cmos_nand_2.txt")
+
+        results = find_equivalence(C1, C2, classical=True)
+        self.assertEqual(results['pMOS_0'], 'pMOS_A')
+        self.assertEqual(results['nMOS_1'], 'nMOS_B')
+
+    def test_swapped_transistor_types(self):
+        C1 = Circuit("netlists/cmos_nand_1.txt")
+        C2 = Circuit("netlists/cmos_nor_1.txt")
+
+        self.assertNotEqual(find_isomorphism(C1.G, C2.G, classical=True), None)
+        self.assertEqual(find_equivalence(C1, C2, classical=True), None)
+
+
 @unittest.skipUnless(hybrid_solver_available(), "requires hybrid solver")
 class TestIntegration(unittest.TestCase):
     @retried(retries=3)
     def test_integration(self):
-        file_path = os.path.join(example_dir, "equivalence.py")
-
-        output = subprocess.check_output([sys.executable, file_path])
+        output = subprocess.check_output([sys.executable, example_file])
         output = output.decode('utf-8') # Bytes to str
 
         self.assertIn('circuits are equivalent', output.lower())